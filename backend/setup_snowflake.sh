@@ -189,7 +189,7 @@ echo "1. Merge .env.snowflake into your .env file:"
 echo -e "   ${YELLOW}cat .env.snowflake >> .env${NC}"
 echo ""
 echo "2. Install Python dependencies:"
-echo -e "   ${YELLOW}uv pip install snowflake-connector-python${NC}"
+echo -e "   ${YELLOW}uv pip install snowflake-connector-python msgspec${NC}"
 echo ""
 echo "3. Restart your FastAPI backend"
 echo ""
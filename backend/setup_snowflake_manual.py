@@ -4,6 +4,7 @@ Manual Snowflake Setup Script using Python
 Uses PAT authentication directly
 """
 import os
+import re
 import sys
 
 try:
@@ -15,6 +16,31 @@ except ImportError:
     import snowflake.connector
     from dotenv import load_dotenv
 
+# Matches quoted literals (kept as-is, so "--" or ";" inside them is safe),
+# "--" line comments, /* */ block comments and statement separators
+SQL_TOKEN_RE = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/|;", re.DOTALL)
+
+
+def split_sql_statements(sql_content: str) -> list:
+    """Strip comments from a SQL script and split it into statements"""
+    statements = []
+    current = []
+    pos = 0
+    for match in SQL_TOKEN_RE.finditer(sql_content):
+        current.append(sql_content[pos:match.start()])
+        token = match.group()
+        if token == ';':
+            statements.append(''.join(current))
+            current = []
+        elif token.startswith("'"):
+            current.append(token)
+        pos = match.end()
+    current.append(sql_content[pos:])
+    statements.append(''.join(current))
+
+    return [s.strip() for s in statements if s.strip()]
+
+
 def setup_snowflake():
     """Setup Snowflake logging infrastructure using PAT"""
 
@@ -89,18 +115,14 @@ def setup_snowflake():
         with open('snowflake_setup.sql', 'r') as f:
             sql_content = f.read()
 
-        # Split by semicolons and execute each statement
-        statements = [s.strip() for s in sql_content.split(';') if s.strip() and not s.strip().startswith('--')]
-
-        for stmt in statements:
-            # Skip comments and empty statements
-            if stmt and not stmt.startswith('--') and 'comment' not in stmt.lower() or 'create' in stmt.lower():
-                try:
-                    cursor.execute(stmt)
-                except Exception as e:
-                    # Continue on errors (object might already exist)
-                    if 'already exists' not in str(e).lower():
-                        print(f"Warning: {e}")
+        # Strip comments, split by semicolons and execute each statement
+        for stmt in split_sql_statements(sql_content):
+            try:
+                cursor.execute(stmt)
+            except Exception as e:
+                # Continue on errors (object might already exist)
+                if 'already exists' not in str(e).lower():
+                    print(f"Warning: {e}")
 
         cursor.close()
         print("✓ Snowflake resources provisioned successfully")
@@ -182,7 +204,7 @@ SNOWFLAKE_FLUSH_INTERVAL=5
     print("   cat .env.snowflake >> .env")
     print()
     print("2. Install Python dependencies (if not already done):")
-    print("   uv pip install snowflake-connector-python")
+    print("   uv pip install snowflake-connector-python msgspec")
     print()
     print("3. Start your FastAPI backend:")
     print("   python main.py")
@@ -5,19 +5,80 @@ Streams all application logs to Snowflake for persistence and analytics
 import os
 import logging
 import threading
-import queue
 import time
 import traceback
 import socket
-from typing import Optional, Dict, Any
-from datetime import datetime
+from collections import deque
+from typing import Optional, Any, Tuple
+
+import msgspec
 
 try:
     import snowflake.connector
     from snowflake.connector import DictCursor
+    from snowflake.connector.errors import InterfaceError, OperationalError
     SNOWFLAKE_AVAILABLE = True
+    # Flush errors worth retrying with the same rows (network/connection trouble)
+    _RETRYABLE_ERRORS = (InterfaceError, OperationalError)
 except ImportError:
     SNOWFLAKE_AVAILABLE = False
+    _RETRYABLE_ERRORS = ()
+
+# Consecutive retryable flush failures before a batch is given up on
+_MAX_FLUSH_RETRIES = 3
+
+# Seconds close() waits to reconnect so remaining logs can be flushed
+_CLOSE_LOGIN_TIMEOUT = 10
+
+# Shared metadata JSON encoder, reused for every log record
+_METADATA_ENCODER = msgspec.json.Encoder()
+
+
+def _dumps(obj: Any) -> str:
+    return _METADATA_ENCODER.encode(obj).decode()
+
+# LogRecord attributes stored in dedicated columns (or not worth storing);
+# everything else on a record goes into the metadata column
+_STANDARD_LOGRECORD_FIELDS = frozenset({
+    'name', 'msg', 'args', 'created', 'filename', 'funcName',
+    'levelname', 'levelno', 'lineno', 'module', 'msecs',
+    'message', 'pathname', 'process', 'processName', 'relativeCreated',
+    'thread', 'threadName', 'taskName', 'exc_info', 'exc_text', 'stack_info',
+    'agent_id', 'endpoint', 'execution_context',
+})
+
+# Values of exactly these types are JSON-serializable as-is (ints only within
+# 64 bits, the widest msgspec accepts); subclasses such as numpy.float64 are not
+_JSON_SCALAR_TYPES = frozenset({str, int, float, bool, type(None)})
+_JSON_INT_MIN = -2 ** 63
+_JSON_INT_MAX = 2 ** 64 - 1
+
+# app_logs columns in the order _format_record emits them
+_COLUMNS = (
+    'log_timestamp', 'level', 'logger_name', 'message',
+    'agent_id', 'endpoint', 'execution_context',
+    'exception_type', 'exception_message', 'stack_trace',
+    'metadata', 'host', 'process_id', 'thread_name',
+)
+
+# Conversions applied in the INSERT's SELECT list (not allowed inside VALUES)
+_COLUMN_CONVERSIONS = {
+    'log_timestamp': 'TO_TIMESTAMP_NTZ',
+    'metadata': 'PARSE_JSON',
+}
+
+
+def _build_insert_prefix(table_name: str) -> str:
+    """Build the fixed part of the batch INSERT, up to the VALUES rows"""
+    select_list = []
+    for i, column in enumerate(_COLUMNS, start=1):
+        conversion = _COLUMN_CONVERSIONS.get(column)
+        select_list.append(f"{conversion}(column{i})" if conversion else f"column{i}")
+
+    return (
+        f"INSERT INTO {table_name} ({', '.join(_COLUMNS)}) "
+        f"SELECT {', '.join(select_list)} FROM VALUES "
+    )
 
 
 class SnowflakeHandler(logging.Handler):
@@ -43,7 +104,9 @@ class SnowflakeHandler(logging.Handler):
         role: Optional[str] = None,
         batch_size: int = 100,
         flush_interval: float = 5.0,
-        table_name: str = "app_logs"
+        table_name: str = "app_logs",
+        max_queue: int = 10000,
+        always_format_tb: bool = False
     ):
         super().__init__()
 
@@ -64,16 +127,29 @@ class SnowflakeHandler(logging.Handler):
         self.role = role
         self.table_name = table_name
 
+        # Full tracebacks are only formatted for WARNING and above unless set
+        self.always_format_tb = always_format_tb
+
         # Batching configuration
         self.batch_size = batch_size
         self.flush_interval = flush_interval
 
-        # Thread-safe queue for log records
-        self.log_queue = queue.Queue()
+        # Bounded queue of formatted rows; deque append/popleft are atomic, and
+        # once full the oldest records are dropped instead of blocking emit()
+        self.log_queue: deque = deque(maxlen=max_queue)
+        self._wake = threading.Event()
 
-        # Connection and batch buffer
+        # Connection and batch buffer. Rows that fail to flush stay in the batch
+        # for the next attempt, while new rows wait in log_queue (which drops the
+        # oldest once full); close() flushes up to four batches per statement
         self.connection: Optional[snowflake.connector.SnowflakeConnection] = None
-        self.batch: list = []
+        self.batch: deque = deque(maxlen=batch_size * 4)
+        self._retry_at = 0.0
+        self._flush_failures = 0
+
+        # Reconnects run on their own (daemon) thread so the worker never blocks
+        # on a connection handshake while logs keep arriving
+        self._reconnect_thread: Optional[threading.Thread] = None
 
         # Background thread control
         self.running = False
@@ -82,11 +158,17 @@ class SnowflakeHandler(logging.Handler):
         # Metadata
         self.hostname = socket.gethostname()
 
+        # INSERT statement is fixed per handler; only the number of VALUES rows
+        # varies, so the statement for a full batch (the common case) is built once
+        self._insert_prefix = _build_insert_prefix(self.table_name)
+        self._row_placeholder = "(" + ", ".join(["%s"] * len(_COLUMNS)) + ")"
+        self._full_batch_sql = self._insert_sql(batch_size)
+
         # Initialize connection and start worker
         self._connect()
         self._start_worker()
 
-    def _connect(self):
+    def _connect(self, login_timeout: Optional[int] = None):
         """Establish connection to Snowflake"""
         try:
             conn_params = {
@@ -107,6 +189,9 @@ class SnowflakeHandler(logging.Handler):
             if self.role:
                 conn_params['role'] = self.role
 
+            if login_timeout is not None:
+                conn_params['login_timeout'] = login_timeout
+
             self.connection = snowflake.connector.connect(**conn_params)
             auth_method = "PAT" if self.token else "password"
             logging.info(f"✓ Connected to Snowflake ({auth_method}): {self.database}.{self.schema}")
@@ -128,17 +213,18 @@ class SnowflakeHandler(logging.Handler):
 
         while self.running:
             try:
-                # Try to get log record with timeout
-                try:
-                    record = self.log_queue.get(timeout=1.0)
-                    self.batch.append(self._format_record(record))
-                    self.log_queue.task_done()
-                except queue.Empty:
-                    pass
+                # Wait for new records (or timeout), then drain up to a full batch.
+                # While a failed batch awaits its retry, new rows stay in log_queue
+                retrying = bool(self.batch) and (time.time() < self._retry_at or not self.connection)
+                if not self.log_queue or retrying:
+                    self._wake.wait(timeout=1.0)
+                self._wake.clear()
+                while self.log_queue and not retrying and len(self.batch) < self.batch_size:
+                    self.batch.append(self.log_queue.popleft())
 
                 # Flush if batch is full or interval elapsed
                 current_time = time.time()
-                should_flush = (
+                should_flush = current_time >= self._retry_at and (
                     len(self.batch) >= self.batch_size or
                     (self.batch and current_time - last_flush >= self.flush_interval)
                 )
@@ -151,8 +237,8 @@ class SnowflakeHandler(logging.Handler):
                 logging.error(f"Error in Snowflake worker: {e}")
                 time.sleep(1)  # Back off on error
 
-    def _format_record(self, record: logging.LogRecord) -> Dict[str, Any]:
-        """Convert LogRecord to Snowflake row format"""
+    def _format_record(self, record: logging.LogRecord) -> Tuple[Any, ...]:
+        """Convert LogRecord to Snowflake row format, with metadata already serialized"""
 
         # Extract exception info if present
         exception_type = None
@@ -162,132 +248,136 @@ class SnowflakeHandler(logging.Handler):
         if record.exc_info:
             exception_type = record.exc_info[0].__name__ if record.exc_info[0] else None
             exception_message = str(record.exc_info[1]) if record.exc_info[1] else None
-            stack_trace = ''.join(traceback.format_exception(*record.exc_info))
+            # Formatting walks every frame, so skip it for INFO/DEBUG records
+            if self.always_format_tb or record.levelno >= logging.WARNING:
+                stack_trace = ''.join(traceback.format_exception(*record.exc_info))
 
-        # Extract custom fields from record
-        agent_id = getattr(record, 'agent_id', None)
-        endpoint = getattr(record, 'endpoint', None)
-        execution_context = getattr(record, 'execution_context', None)
+        # Extract custom fields (passed via extra=...) straight from the record dict
+        record_dict = record.__dict__
+        agent_id = record_dict.get('agent_id')
+        endpoint = record_dict.get('endpoint')
+        execution_context = record_dict.get('execution_context')
 
         # Build metadata object with extra fields
         metadata = {}
-        for key, value in record.__dict__.items():
-            if key not in ['name', 'msg', 'args', 'created', 'filename', 'funcName',
-                          'levelname', 'levelno', 'lineno', 'module', 'msecs',
-                          'message', 'pathname', 'process', 'processName', 'relativeCreated',
-                          'thread', 'threadName', 'exc_info', 'exc_text', 'stack_info',
-                          'agent_id', 'endpoint', 'execution_context']:
-                try:
-                    # Only include JSON-serializable values
-                    metadata[key] = str(value)
-                except:
-                    pass
-
-        return {
-            'log_timestamp': datetime.fromtimestamp(record.created),
-            'level': record.levelname,
-            'logger_name': record.name,
-            'message': record.getMessage(),
-            'agent_id': agent_id,
-            'endpoint': endpoint,
-            'execution_context': execution_context,
-            'exception_type': exception_type,
-            'exception_message': exception_message,
-            'stack_trace': stack_trace,
-            'metadata': metadata if metadata else None,
-            'host': self.hostname,
-            'process_id': record.process,
-            'thread_name': record.threadName,
-        }
-
-    def _flush_batch(self):
-        """Flush current batch to Snowflake"""
+        for key, value in record_dict.items():
+            if key not in _STANDARD_LOGRECORD_FIELDS:
+                # Keep JSON scalars as-is, stringify everything else
+                value_type = type(value)
+                if value_type in _JSON_SCALAR_TYPES and not (
+                    value_type is int and not _JSON_INT_MIN <= value <= _JSON_INT_MAX
+                ):
+                    metadata[key] = value
+                else:
+                    try:
+                        metadata[key] = str(value)
+                    except Exception:
+                        pass
+
+        metadata_json = None
+        if metadata:
+            try:
+                metadata_json = _dumps(metadata)
+            except (TypeError, ValueError, msgspec.EncodeError):
+                # Never lose the record over metadata; fall back to plain strings
+                metadata_json = _dumps({key: str(value) for key, value in metadata.items()})
+
+        # Positional row, in _COLUMNS order
+        return (
+            record.created,  # epoch seconds, converted by Snowflake
+            record.levelname,
+            record.name,
+            record.getMessage(),
+            agent_id,
+            endpoint,
+            execution_context,
+            exception_type,
+            exception_message,
+            stack_trace,
+            metadata_json,
+            self.hostname,
+            record.process,
+            record.threadName,
+        )
+
+    def _insert_sql(self, row_count: int) -> str:
+        """Build the batch INSERT statement for the given number of rows"""
+        return self._insert_prefix + ", ".join([self._row_placeholder] * row_count)
+
+    def _flush_batch(self) -> bool:
+        """Flush current batch to Snowflake, returning True if it was written"""
         if not self.batch:
-            return
+            return True
 
         if not self.connection:
-            # Try to reconnect
-            self._connect()
+            # Reconnect in the background and keep the batch until it completes
+            if self._reconnect_thread is None:
+                self._reconnect_thread = threading.Thread(
+                    target=self._connect, name="snowflake-reconnect", daemon=True
+                )
+                self._reconnect_thread.start()
+            if self._reconnect_thread.is_alive():
+                return False
+
+            self._reconnect_thread = None
             if not self.connection:
-                logging.warning(f"Cannot flush {len(self.batch)} logs - no Snowflake connection")
-                self.batch.clear()
-                return
+                logging.warning(f"Cannot flush {len(self.batch)} logs - no Snowflake connection, will retry")
+                self._retry_at = time.time() + self.flush_interval
+                return False
 
         try:
             cursor = self.connection.cursor()
 
-            # Insert each row individually to handle PARSE_JSON properly
-            import json
-
-            for row in self.batch:
-                metadata_json = json.dumps(row['metadata']) if row['metadata'] else None
-
-                if metadata_json:
-                    insert_sql = f"""
-                        INSERT INTO {self.table_name} (
-                            log_timestamp, level, logger_name, message,
-                            agent_id, endpoint, execution_context,
-                            exception_type, exception_message, stack_trace,
-                            metadata, host, process_id, thread_name
-                        ) SELECT
-                            %s, %s, %s, %s,
-                            %s, %s, %s,
-                            %s, %s, %s,
-                            PARSE_JSON(%s), %s, %s, %s
-                    """
-                    cursor.execute(insert_sql, (
-                        row['log_timestamp'], row['level'], row['logger_name'], row['message'],
-                        row['agent_id'], row['endpoint'], row['execution_context'],
-                        row['exception_type'], row['exception_message'], row['stack_trace'],
-                        metadata_json, row['host'], row['process_id'], row['thread_name']
-                    ))
-                else:
-                    insert_sql = f"""
-                        INSERT INTO {self.table_name} (
-                            log_timestamp, level, logger_name, message,
-                            agent_id, endpoint, execution_context,
-                            exception_type, exception_message, stack_trace,
-                            metadata, host, process_id, thread_name
-                        ) VALUES (
-                            %s, %s, %s, %s,
-                            %s, %s, %s,
-                            %s, %s, %s,
-                            NULL, %s, %s, %s
-                        )
-                    """
-                    cursor.execute(insert_sql, (
-                        row['log_timestamp'], row['level'], row['logger_name'], row['message'],
-                        row['agent_id'], row['endpoint'], row['execution_context'],
-                        row['exception_type'], row['exception_message'], row['stack_trace'],
-                        row['host'], row['process_id'], row['thread_name']
-                    ))
+            # Insert the whole batch with a single multi-row statement.
+            # PARSE_JSON is not allowed inside a VALUES clause, so the rows are
+            # bound as an inline VALUES table and converted in the SELECT list.
+            params = [value for row in self.batch for value in row]
+            row_count = len(self.batch)
+            insert_sql = self._full_batch_sql if row_count == self.batch_size else self._insert_sql(row_count)
+            cursor.execute(insert_sql, params)
             cursor.close()
 
             logging.debug(f"✓ Flushed {len(self.batch)} logs to Snowflake")
             self.batch.clear()
+            self._flush_failures = 0
+            return True
+
+        except _RETRYABLE_ERRORS as e:
+            self._flush_failures += 1
+            if self._flush_failures >= _MAX_FLUSH_RETRIES:
+                logging.error(f"Failed to flush logs to Snowflake, dropping {len(self.batch)} logs: {e}")
+                self.batch.clear()
+                self._flush_failures = 0
+            else:
+                logging.error(f"Failed to flush logs to Snowflake, will retry: {e}")
+            # Reconnect before the next attempt
+            self._retry_at = time.time() + self.flush_interval
+            self.connection = None
+            self._reconnect_thread = None
+            return False
 
         except Exception as e:
-            logging.error(f"Failed to flush logs to Snowflake: {e}")
-            # Clear batch to avoid infinite retry
+            # Data errors (e.g. a value too long for its column) fail the same
+            # way on every retry, so drop the batch rather than block logging
+            logging.error(f"Failed to flush logs to Snowflake, dropping {len(self.batch)} logs: {e}")
             self.batch.clear()
-            # Try to reconnect for next batch
-            self.connection = None
+            self._flush_failures = 0
+            return False
 
     def emit(self, record: logging.LogRecord):
         """
-        Handle a log record by adding it to the queue.
-        This is called by the logging framework and must be fast.
+        Format a log record into a ready-to-insert row and add it to the queue.
+        This is called by the logging framework and must be fast; formatting
+        here touches the record once, leaving the worker with I/O only.
         """
         try:
             # Avoid infinite loop - don't log our own snowflake operations
             if record.name.startswith('snowflake'):
                 return
 
-            self.log_queue.put_nowait(record)
+            self.log_queue.append(self._format_record(record))
+            self._wake.set()
 
-        except queue.Full:
-            # Queue is full, drop the log to avoid blocking
-            pass
         except Exception:
             self.handleError(record)
 
@@ -300,8 +390,23 @@ class SnowflakeHandler(logging.Handler):
         if self.worker_thread:
             self.worker_thread.join(timeout=10)
 
-        # Flush any remaining logs
-        self._flush_batch()
+        # Flush remaining logs, making one bounded reconnect attempt if needed
+        if self.batch or self.log_queue:
+            reconnect_thread = self._reconnect_thread
+            if reconnect_thread is not None:
+                reconnect_thread.join(timeout=_CLOSE_LOGIN_TIMEOUT)
+            if not self.connection and not (reconnect_thread and reconnect_thread.is_alive()):
+                self._connect(login_timeout=_CLOSE_LOGIN_TIMEOUT)
+
+            # Only drain rows queued so far: errors logged while flushing are
+            # queued by this handler too and must not keep the loop going
+            remaining = len(self.log_queue)
+            while self.connection:
+                while remaining and self.log_queue and len(self.batch) < self.batch.maxlen:
+                    self.batch.append(self.log_queue.popleft())
+                    remaining -= 1
+                if not self.batch or not self._flush_batch():
+                    break
 
         # Close connection
         if self.connection:
@@ -50,7 +50,7 @@ USE SCHEMA LOG_DB.RAW;
 CREATE TABLE IF NOT EXISTS app_logs (
   -- Timestamp fields
   log_timestamp TIMESTAMP_NTZ NOT NULL,
-  ingestion_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+  ingestion_timestamp TIMESTAMP_NTZ DEFAULT SYSDATE(),  -- UTC, like log_timestamp
 
   -- Core log fields
   level VARCHAR(20) NOT NULL,
@@ -98,7 +98,7 @@ SELECT
   exception_message
 FROM app_logs
 WHERE level IN ('ERROR', 'CRITICAL')
-  AND log_timestamp >= DATEADD(hour, -24, CURRENT_TIMESTAMP())
+  AND log_timestamp >= DATEADD(hour, -24, SYSDATE())
 ORDER BY log_timestamp DESC;
 
 GRANT SELECT ON VIEW recent_errors TO ROLE LOG_INGESTOR;
@@ -159,6 +159,6 @@ WHERE TABLE_SCHEMA = 'RAW' AND TABLE_NAME = 'APP_LOGS';
 --    SNOWFLAKE_DATABASE=LOG_DB
 --    SNOWFLAKE_SCHEMA=RAW
 --    SNOWFLAKE_WAREHOUSE=LOG_WH
--- 3. Run: uv pip install snowflake-connector-python
+-- 3. Run: uv pip install snowflake-connector-python msgspec
 -- 4. Restart your FastAPI backend
 -- ============================================================================
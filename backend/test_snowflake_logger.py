@@ -0,0 +1,163 @@
+"""
+Unit tests for the Snowflake logging handler, using a stub connection
+Run with: python -m pytest test_snowflake_logger.py
+"""
+import logging
+import threading
+
+import pytest
+import snowflake.connector
+from snowflake.connector.errors import OperationalError, ProgrammingError
+
+import snowflake_logger
+from snowflake_logger import SnowflakeHandler, _COLUMNS
+
+
+class StubCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        if self.connection.error is not None:
+            raise self.connection.error
+        self.connection.executed.append((sql, params))
+
+    def close(self):
+        pass
+
+
+class StubConnection:
+    def __init__(self):
+        self.executed = []
+        self.error = None
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    conn = StubConnection()
+    monkeypatch.setattr(snowflake.connector, "connect", lambda **kwargs: conn)
+    return conn
+
+
+@pytest.fixture
+def handler(connection):
+    handler = SnowflakeHandler(account="acct", user="user", password="pw", batch_size=3, flush_interval=60)
+    # Stop the background worker so tests drive flushing directly
+    handler.running = False
+    handler._wake.set()
+    handler.worker_thread.join(timeout=5)
+    yield handler
+    handler.close()
+
+
+def make_record(msg="hello", level=logging.INFO, **extra):
+    record = logging.LogRecord("test", level, __file__, 1, msg, None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def flushed_messages(connection):
+    message_index = _COLUMNS.index("message")
+    return [
+        params[i + message_index]
+        for _, params in connection.executed
+        for i in range(0, len(params), len(_COLUMNS))
+    ]
+
+
+def test_format_record_without_extras_has_no_metadata(handler):
+    row = handler._format_record(make_record())
+    assert len(row) == len(_COLUMNS)
+    assert row[_COLUMNS.index("metadata")] is None
+
+
+def test_format_record_metadata_typing(handler):
+    class MyFloat(float):
+        pass
+
+    class MyStr(str):
+        pass
+
+    row = handler._format_record(make_record(
+        agent_id="agent-1", count=3, ratio=0.5, flag=True, nothing=None,
+        big=2 ** 70, sub_float=MyFloat(1.5), sub_str=MyStr("x"), obj=[1, 2],
+    ))
+
+    assert row[_COLUMNS.index("agent_id")] == "agent-1"
+    metadata = snowflake_logger.msgspec.json.decode(row[_COLUMNS.index("metadata")])
+    assert metadata == {
+        "count": 3, "ratio": 0.5, "flag": True, "nothing": None,
+        "big": str(2 ** 70), "sub_float": "1.5", "sub_str": "x", "obj": "[1, 2]",
+    }
+
+
+def test_insert_sql_shape(handler):
+    sql = handler._insert_sql(2)
+    assert sql.startswith(f"INSERT INTO app_logs ({', '.join(_COLUMNS)}) SELECT ")
+    assert "TO_TIMESTAMP_NTZ(column1)" in sql
+    assert "PARSE_JSON(column11)" in sql
+    assert sql.count("%s") == 2 * len(_COLUMNS)
+    assert handler._full_batch_sql == handler._insert_sql(handler.batch_size)
+
+
+def test_flush_writes_batch(handler, connection):
+    handler.batch.extend(handler._format_record(make_record(f"m{i}")) for i in range(2))
+
+    assert handler._flush_batch()
+    assert not handler.batch
+    assert flushed_messages(connection) == ["m0", "m1"]
+
+
+def test_retryable_error_keeps_batch_until_retry_cap(handler, connection):
+    connection.error = OperationalError("connection lost")
+    handler.batch.append(handler._format_record(make_record()))
+
+    for _ in range(snowflake_logger._MAX_FLUSH_RETRIES - 1):
+        assert not handler._flush_batch()
+        assert len(handler.batch) == 1
+        assert handler.connection is None
+        handler.connection = connection
+
+    assert not handler._flush_batch()
+    assert not handler.batch
+
+
+def test_non_retryable_error_drops_batch(handler, connection):
+    connection.error = ProgrammingError("table does not exist")
+    handler.batch.append(handler._format_record(make_record()))
+
+    assert not handler._flush_batch()
+    assert not handler.batch
+    assert handler.connection is connection
+
+
+def test_close_flushes_queued_rows(handler, connection):
+    for i in range(5):
+        handler.log_queue.append(handler._format_record(make_record(f"m{i}")))
+
+    handler.close()
+
+    assert flushed_messages(connection) == [f"m{i}" for i in range(5)]
+
+
+def test_close_terminates_when_flush_keeps_failing(handler, connection):
+    # Errors logged while flushing come back through the handler itself
+    connection.error = ProgrammingError("insufficient privileges")
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        for i in range(5):
+            logging.getLogger("test").warning("m%d", i)
+
+        closer = threading.Thread(target=handler.close, daemon=True)
+        closer.start()
+        closer.join(timeout=5)
+        assert not closer.is_alive()
+    finally:
+        root.removeHandler(handler)